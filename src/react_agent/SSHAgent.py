@@ -1,32 +1,162 @@
+import base64
+import hashlib
 import pexpect
+import queue
 import re
 import os
+import shlex
+import subprocess
+import tempfile
 import threading
 import time
+import uuid
+
+# Precompiled ANSI escape sequence pattern (constant, so compile once at import)
+_ANSI_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
+# Detects "press enter/return to continue" style prompts so the reader can
+# acknowledge them; one case-insensitive regex scan per chunk, no .lower()
+# copy. A bytes pattern, since the reader works on raw pty bytes.
+_PROMPT_RE = re.compile(rb'(?i)press\s+(?:enter|return|any key)')
+
+# Login-time patterns, compiled once; pexpect accepts compiled regexes
+# directly, so these skip the per-call pattern-list compilation in expect()
+_SHELL_PROMPT_RE = re.compile(rb'[$#>]')
+_PASSWORD_RE = re.compile(rb'[Pp]assword:')
+
+# Write payloads whose encoded command line would exceed the pty's canonical
+# input limit (~4 KiB) go through scp instead of the shell channel
+_SHELL_WRITE_LIMIT = 2048
+
+# Medium payloads are streamed over the shell channel as fixed-size append
+# commands; beyond this size scp's bulk transfer wins
+_SHELL_STREAM_LIMIT = 256 * 1024
+_SHELL_CHUNK_SIZE = 1500
+
+# Environment exported once after login: prefixing each command line with
+# VAR=... assignments would break commands starting with a shell reserved
+# word (for/if/while one-liners, subshells), and exporting up front also
+# costs zero extra bytes per command
+_ENV_EXPORTS = 'export PAGER=cat SYSTEMD_PAGER= DEBIAN_FRONTEND=noninteractive'
+
+# Pool of live agents keyed by target plus credentials so repeat
+# connections to the same target skip the SSH handshake entirely;
+# connecting with different credentials never reuses an old session
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def _cred_fingerprint(password, pkey_path):
+    # Digest rather than plaintext so the password shows up in neither
+    # pool-key tuples nor control socket paths
+    return hashlib.sha256(repr((password, pkey_path)).encode()).hexdigest()[:12]
+
+
+def _pool_key(hostname, port, username, password, pkey_path):
+    return (hostname, port, username, _cred_fingerprint(password, pkey_path))
+
+def _strip_ansi(text):
+    # Fast path: most chunks contain no escape sequences at all, and a
+    # single-character containment check is much cheaper than a scan
+    if '\x1b' not in text:
+        return text
+    # Single pass over the text: jump between ESC bytes with str.find
+    # (a C-level scan) and skip over CSI parameter/intermediate bytes
+    # explicitly, so no per-match object is allocated. Semantics match
+    # _ANSI_RE: unrecognised or truncated sequences are kept verbatim.
+    out = []
+    append = out.append
+    find = text.find
+    n = len(text)
+    i = 0
+    while i < n:
+        j = find('\x1b', i)
+        if j == -1:
+            append(text[i:])
+            break
+        append(text[i:j])
+        k = j + 1
+        if k < n:
+            c = text[k]
+            if c == '[':
+                # CSI: parameter bytes, intermediate bytes, final byte
+                k += 1
+                while k < n and '0' <= text[k] <= '?':
+                    k += 1
+                while k < n and ' ' <= text[k] <= '/':
+                    k += 1
+                if k < n and '@' <= text[k] <= '~':
+                    i = k + 1
+                    continue
+            elif '@' <= c <= '_':
+                # Two-character escape sequence
+                i = k + 1
+                continue
+        # Not a recognised escape sequence: keep the ESC literally
+        append('\x1b')
+        i = j + 1
+    return ''.join(out)
+
 
 class SSHAgent:
     def __init__(self, hostname, port, username, password=None, pkey_path=None):
+        # Multiplex every ssh/scp invocation for this target over one
+        # authenticated connection: the interactive shell below becomes the
+        # control master, and later scp calls attach to its socket instead
+        # of paying a fresh TCP + key-exchange + auth handshake per file.
+        # The credential fingerprint keeps masters per credential set: a
+        # plain target-keyed socket would let a session opened with new
+        # credentials silently multiplex over the old authenticated master
+        # without ever validating them
+        cred_fp = _cred_fingerprint(password, pkey_path)
+        self.control_path = (
+            f"/tmp/sshagent_cm_{os.getpid()}_{hostname}_{port}_{username}_{cred_fp}"
+        )
+        self._control_opt_args = [
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={self.control_path}',
+            '-o', 'ControlPersist=60',
+        ]
+        self._control_opts = ' '.join(self._control_opt_args)
+
         # Build SSH command
-        ssh_command = f"ssh {username}@{hostname} -p {port}"
-        
+        ssh_command = f"ssh {self._control_opts} {username}@{hostname} -p {port}"
+
         # Add identity file if provided
         if pkey_path:
             ssh_command += f" -i {pkey_path}"
+
+        # Spawn the SSH process in bytes mode: the reader buffers raw bytes
+        # and decoding happens once per get_output() over the joined buffer,
+        # so multibyte sequences split across chunk boundaries survive.
+        # maxread (default 2000) caps how much pexpect pulls off the pty per
+        # read; 64 KiB keeps large transfers (base64 file reads, verbose
+        # command output) from being chopped into thousands of tiny reads
+        self.child = pexpect.spawn(ssh_command, maxread=65536)
         
-        # Spawn the SSH process
-        self.child = pexpect.spawn(ssh_command, encoding='utf-8')
-        
-        # Handle login
+        # Handle login. With ControlPersist a mux master from a recently
+        # closed session may still hold the socket; attaching to it skips
+        # authentication entirely, so the shell prompt can arrive with no
+        # password prompt ever shown - accept either, like _run_scp does
         if not pkey_path:
-            self.child.expect(['password:', 'Password:'])
-            self.child.sendline(password)
-        
-        # Wait for prompt
-        self.child.expect(['[$#>]'])
-        
-        # Buffer for output
-        self.output_buffer = ""
-        self.lock = threading.Lock()
+            index = self.child.expect([_PASSWORD_RE, _SHELL_PROMPT_RE])
+            if index == 0:
+                self.child.sendline(password)
+                self.child.expect(_SHELL_PROMPT_RE)
+        else:
+            # Wait for prompt
+            self.child.expect(_SHELL_PROMPT_RE)
+
+        # Set up the session environment once, consuming the echoed command
+        # and the prompt that follows it before the reader thread starts
+        self.child.sendline(_ENV_EXPORTS)
+        self.child.expect(_SHELL_PROMPT_RE)
+
+        # Buffer for output: SimpleQueue is a C-implemented single-producer/
+        # single-consumer channel, so the reader thread and get_output() no
+        # longer contend on a Python-level mutex; chunks are joined lazily
+        # in get_output(), keeping accumulation O(total bytes)
+        self.output_queue = queue.SimpleQueue()
         
         # SCP options for file transfer
         self.hostname = hostname
@@ -35,108 +165,281 @@ class SSHAgent:
         self.password = password
         self.pkey_path = pkey_path
         
-        # Start background reader thread
-        self.keep_reading = True
-        self.reader_thread = threading.Thread(target=self._read_output)
+        # Reference count used by the module-level pool; direct constructor
+        # use behaves as a single-owner connection
+        self.refcount = 1
+
+        # Whether the reader's last burst filled its read buffer (a hint
+        # that more output is likely still in flight)
+        self._last_burst_full = False
+
+        # Start background reader thread; daemon so process exit never hangs
+        # on it, Event so close() can signal shutdown without polling a bool
+        self._stop = threading.Event()
+        self.reader_thread = threading.Thread(target=self._read_output,
+                                              daemon=True)
         self.reader_thread.start()
-    
-    def _strip_ansi(self, text):
-        ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-        return ansi_escape.sub('', text)
+
+    @classmethod
+    def connect(cls, hostname, port, username, password=None, pkey_path=None):
+        """Return a pooled agent for the target, creating one if needed.
+
+        Reusing a live agent avoids the multi-round-trip key exchange and
+        authentication that a fresh connection pays (typically hundreds of
+        milliseconds). Each caller must balance this with a close() call;
+        the underlying connection is torn down when the last user closes.
+        """
+        key = _pool_key(hostname, port, username, password, pkey_path)
+        with _pool_lock:
+            agent = _pool.get(key)
+            if agent is not None and agent.is_alive():
+                agent.refcount += 1
+                return agent
+            agent = cls(hostname, port, username, password=password,
+                        pkey_path=pkey_path)
+            agent._pool_key = key
+            _pool[key] = agent
+            return agent
+
+    def is_alive(self):
+        """Check whether the underlying SSH process is still running."""
+        try:
+            return self.child.isalive()
+        except Exception:
+            return False
     
     def _read_output(self):
-        while self.keep_reading:
+        while not self._stop.is_set():
             try:
-                # Check if there's output to read (non-blocking)
-                index = self.child.expect([pexpect.TIMEOUT, '.+'], timeout=0.1)
-                if index == 1:  # Got some output
-                    with self.lock:
-                        self.output_buffer += self.child.match.group(0)
-            except Exception as e:
+                # Drain the pty directly; read_nonblocking blocks up to the
+                # timeout without running the expect state machine (no regex
+                # execution or match-object allocation per chunk)
+                burst = [self.child.read_nonblocking(size=65536, timeout=0.5)]
+                # Coalesce everything already queued on the fd into this
+                # wakeup so the lock is taken once per burst, not per chunk
+                while True:
+                    try:
+                        burst.append(
+                            self.child.read_nonblocking(size=65536, timeout=0)
+                        )
+                    except pexpect.TIMEOUT:
+                        break
+                chunk = b''.join(burst)
+                # Acknowledge pager-style continuation prompts so the
+                # shell doesn't sit waiting for a keypress
+                if _PROMPT_RE.search(chunk):
+                    self.child.sendline('')
+                self._last_burst_full = len(burst[-1]) >= 65536
+                self.output_queue.put(chunk)
+            except pexpect.TIMEOUT:
+                continue
+            except pexpect.EOF:
+                break
+            except Exception:
                 # Handle any exceptions
                 pass
-            time.sleep(0.1)
     
     def send_command(self, cmd):
-        env_vars = 'PAGER=cat SYSTEMD_PAGER= DEBIAN_FRONTEND=noninteractive '
         self.child.sendline(cmd)
         # Wait a moment for command to start
         time.sleep(0.1)
     
     def get_output(self, strip_ansi=True):
-        with self.lock:
-            output = self.output_buffer
-            self.output_buffer = ""  # Clear after reading
-        return self._strip_ansi(output) if strip_ansi else output
+        chunks = []
+        try:
+            while True:
+                chunks.append(self.output_queue.get_nowait())
+        except queue.Empty:
+            pass
+        # Decode once over the joined buffer rather than per chunk, so
+        # multibyte characters split across reads decode correctly
+        output = b''.join(chunks).decode('utf-8', errors='ignore')
+        return _strip_ansi(output) if strip_ansi else output
     
+    def drain(self, timeout=2.0):
+        """Collect pending output with adaptive backoff.
+
+        Polls get_output() starting at 50 ms and doubling up to the timeout
+        cap, resetting whenever output arrives, so short commands return in
+        tens of milliseconds instead of a fixed multi-second wait. Returns
+        `(output, more_likely)` where `more_likely` hints that the reader's
+        last burst filled its buffer and more output is probably in flight.
+        """
+        delay = 0.05
+        deadline = time.time() + timeout
+        collected = []
+        while True:
+            out = self.get_output()
+            if out:
+                collected.append(out)
+                delay = 0.05
+            elif collected:
+                # Stream went quiet after producing output; stop early
+                break
+            if time.time() >= deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, timeout)
+        return ''.join(collected), self._last_burst_full
+
+    def _run_capture(self, cmd, timeout=30):
+        """Run a command on the interactive shell and capture its output.
+
+        The output is bracketed with unique sentinel markers so it can be
+        separated from the terminal echo and the surrounding prompt noise.
+        """
+        token = uuid.uuid4().hex
+        begin = f"__SSHAGENT_BEGIN_{token}__"
+        end = f"__SSHAGENT_END_{token}__"
+        # Split the markers in the sent line so the terminal echo of the
+        # command itself can never match them
+        self.child.sendline(
+            f'echo "{begin[:4]}""{begin[4:]}"; {cmd}; echo "{end[:4]}""{end[4:]}"'
+        )
+        buf = ""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            buf += self.get_output()
+            stop = buf.find(end)
+            if stop != -1:
+                start = buf.find(begin)
+                if start != -1 and start < stop:
+                    return buf[start + len(begin):stop]
+            time.sleep(0.05)
+        raise TimeoutError(f"Command did not complete within {timeout}s: {cmd}")
+
     def read_file(self, remote_path):
         try:
-            # Create a temporary file
-            local_path = f"/tmp/sshagent_tmp_{os.getpid()}"
-            
-            # Build SCP command
-            scp_command = f"scp -P {self.port}"
-            if self.pkey_path:
-                scp_command += f" -i {self.pkey_path}"
-            
-            scp_command += f" {self.username}@{self.hostname}:{remote_path} {local_path}"
-            
-            # Run SCP command
-            if self.password:
-                # Use pexpect for password authentication
-                scp = pexpect.spawn(scp_command, encoding='utf-8')
-                scp.expect(['password:', 'Password:'])
+            # Stream the file through the already-authenticated shell channel
+            # instead of spawning an scp process per read; base64 keeps binary
+            # and multi-line content intact across the pty
+            encoded = self._run_capture(
+                f"base64 -w0 {shlex.quote(remote_path)}"
+            )
+            # Strip only the line breaks the pty introduces and validate the
+            # rest: without validate=True, b64decode silently skips anything
+            # outside the alphabet, so shell error text captured between the
+            # markers would "decode" to garbage instead of raising into the
+            # scp fallback below
+            encoded = encoded.replace('\r', '').replace('\n', '')
+            return base64.b64decode(encoded, validate=True).decode(
+                'utf-8', errors='replace'
+            )
+        except Exception:
+            # Fall back to scp (e.g. remote lacks base64, or capture timed out)
+            return self._read_file_scp(remote_path)
+
+    def _scp_args(self, source, destination):
+        # Build the SCP argument list (reuses the master connection's socket)
+        args = ['scp'] + self._control_opt_args + ['-P', str(self.port)]
+        if self.pkey_path:
+            args += ['-i', self.pkey_path]
+        args += [source, destination]
+        return args
+
+    def _run_scp(self, source, destination):
+        args = self._scp_args(source, destination)
+        if self.password:
+            # Use pexpect for password authentication; when the transfer
+            # rides the control master no prompt appears, so accept EOF too
+            scp = pexpect.spawn(args[0], args[1:])
+            index = scp.expect([_PASSWORD_RE, pexpect.EOF])
+            if index == 0:
                 scp.sendline(self.password)
                 scp.expect(pexpect.EOF)
-            else:
-                # Use os.system for key-based authentication
-                os.system(scp_command)
-            
+        else:
+            # Exec scp directly: no /bin/sh fork, no shell re-parse, and no
+            # quoting hazards from paths containing shell metacharacters
+            subprocess.run(args, check=True, capture_output=True)
+
+    def _read_file_scp(self, remote_path):
+        local_path = None
+        try:
+            # Collision-safe temporary file instead of a fixed per-pid path
+            fd, local_path = tempfile.mkstemp(prefix='sshagent_')
+            os.close(fd)
+
+            self._run_scp(f"{self.username}@{self.hostname}:{remote_path}",
+                          local_path)
+
             # Read the file
             with open(local_path, 'r') as f:
-                content = f.read()
-            
-            # Clean up
-            os.remove(local_path)
-            return content
+                return f.read()
         except Exception as e:
             return f"Error reading file: {e}"
+        finally:
+            if local_path is not None and os.path.exists(local_path):
+                os.remove(local_path)
     
     def write_file(self, remote_path, content):
+        encoded = base64.b64encode(content.encode('utf-8')).decode('ascii')
+
         try:
-            # Create a temporary file
-            local_path = f"/tmp/sshagent_tmp_{os.getpid()}"
-            
-            # Write content to temporary file
-            with open(local_path, 'w') as f:
-                f.write(content)
-            
-            # Build SCP command
-            scp_command = f"scp -P {self.port}"
-            if self.pkey_path:
-                scp_command += f" -i {self.pkey_path}"
-            
-            scp_command += f" {local_path} {self.username}@{self.hostname}:{remote_path}"
-            
-            # Run SCP command
-            if self.password:
-                # Use pexpect for password authentication
-                scp = pexpect.spawn(scp_command, encoding='utf-8')
-                scp.expect(['password:', 'Password:'])
-                scp.sendline(self.password)
-                scp.expect(pexpect.EOF)
+            if len(encoded) <= _SHELL_WRITE_LIMIT:
+                # Small payload: single command line
+                result = self._run_capture(
+                    f"printf '%s' '{encoded}' | base64 -d > "
+                    f"{shlex.quote(remote_path)} && echo WRITE_OK"
+                )
+            elif len(encoded) <= _SHELL_STREAM_LIMIT:
+                # Medium payload: stream fixed-size slices over the channel
+                result = self._write_file_shell_stream(remote_path, encoded)
             else:
-                # Use os.system for key-based authentication
-                os.system(scp_command)
-            
-            # Clean up
-            os.remove(local_path)
+                # Large payload: bulk transfer
+                return self._write_file_scp(remote_path, content)
+
+            if "WRITE_OK" in result:
+                return "File updated successfully."
+            return self._write_file_scp(remote_path, content)
+        except Exception:
+            return self._write_file_scp(remote_path, content)
+
+    def _write_file_shell_stream(self, remote_path, encoded):
+        """Stream a base64 payload as chunked append commands.
+
+        Each slice stays under the pty's canonical input line limit; the
+        shell executes the appends in order, with pty backpressure pacing
+        the sender, so nothing larger than one slice is ever in flight.
+        """
+        tmp = shlex.quote(f"/tmp/.sshagent_up_{uuid.uuid4().hex[:8]}.b64")
+        self._run_capture(f": > {tmp}")
+        for start in range(0, len(encoded), _SHELL_CHUNK_SIZE):
+            chunk = encoded[start:start + _SHELL_CHUNK_SIZE]
+            self.child.sendline(f"printf '%s' '{chunk}' >> {tmp}")
+        return self._run_capture(
+            f"base64 -d {tmp} > {shlex.quote(remote_path)} && "
+            f"rm -f {tmp} && echo WRITE_OK"
+        )
+
+    def _write_file_scp(self, remote_path, content):
+        local_path = None
+        try:
+            # Collision-safe temporary file instead of a fixed per-pid path
+            with tempfile.NamedTemporaryFile(
+                'w', prefix='sshagent_', delete=False
+            ) as f:
+                local_path = f.name
+                f.write(content)
+
+            self._run_scp(local_path,
+                          f"{self.username}@{self.hostname}:{remote_path}")
+
             return "File updated successfully."
         except Exception as e:
             return f"Error writing file: {e}"
+        finally:
+            if local_path is not None and os.path.exists(local_path):
+                os.remove(local_path)
     
     def close(self):
-        self.keep_reading = False
+        # Pooled agents only disconnect once the last user lets go
+        with _pool_lock:
+            self.refcount -= 1
+            if self.refcount > 0:
+                return
+            _pool.pop(getattr(self, '_pool_key', None), None)
+
+        self._stop.set()
         self.reader_thread.join()
         self.child.sendline("exit")
         self.child.close()
@@ -30,6 +30,17 @@ class Configuration:
         },
     )
 
+    summarizer_model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = field(
+        default="",
+        metadata={
+            "description": "The name of the language model to use for memory summarization. "
+            "A smaller, faster model than the main one cuts the summarization "
+            "call's latency and cost. Leave empty to pick a small model from "
+            "the main model's provider (falling back to the main model itself). "
+            "Should be in the form: provider/model-name."
+        },
+    )
+
     max_search_results: int = field(
         default=10,
         metadata={
@@ -3,7 +3,10 @@
 Works with a chat model with tool calling support.
 """
 
+import asyncio
+import time
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Dict, List, Literal, cast
 
 from langchain_core.messages import AIMessage
@@ -15,7 +18,40 @@ from react_agent.configuration import Configuration
 from react_agent.prompts import MEMORY_SUMMARIZATION_PROMPT
 from react_agent.state import InputState, State
 from react_agent.tools import TOOLS
-from react_agent.utils import load_chat_model, summarize_messages
+from react_agent.utils import load_chat_model, summarize_messages_start
+
+# Small, fast models per provider for the summarization call; summarizing
+# doesn't need the main model's capability and these cut its latency and cost.
+_DEFAULT_SUMMARIZERS = {
+    "anthropic": "anthropic/claude-3-haiku-20240307",
+    "openai": "openai/gpt-4o-mini",
+}
+
+
+def _summarizer_model_name(configuration: Configuration) -> str:
+    """Resolve the summarizer model, staying within the main model's provider.
+
+    An explicit `summarizer_model` wins; otherwise pick the provider's small
+    model, or the main model itself for providers without one. Never crossing
+    providers means an OpenAI-only deployment never needs Anthropic
+    credentials just to summarize.
+    """
+    if configuration.summarizer_model:
+        return configuration.summarizer_model
+    provider = configuration.model.partition("/")[0]
+    return _DEFAULT_SUMMARIZERS.get(provider, configuration.model)
+
+
+@lru_cache(maxsize=8)
+def _render_system_prompt(template: str, minute_bucket: int) -> str:
+    """Render the system prompt, cached per minute.
+
+    The only variable part of the prompt is `{system_time}`, so re-rendering
+    on every model call is wasted work; keying the cache on a minute bucket
+    keeps the timestamp fresh enough.
+    """
+    return template.format(system_time=datetime.now(tz=timezone.utc).isoformat())
+
 
 # Define the function that calls the model
 
@@ -38,24 +74,27 @@ async def call_model(
 
     # Initialize the model with tool binding. Change the model or add more tools here.
     model = load_chat_model(configuration.model).bind_tools(TOOLS)
-    base_model = load_chat_model(configuration.model)
 
     # Format the system prompt. Customize this to change the agent's behavior.
-    system_message = configuration.system_prompt.format(
-        system_time=datetime.now(tz=timezone.utc).isoformat()
+    system_message = _render_system_prompt(
+        configuration.system_prompt, int(time.time() // 60)
     )
     
     # Check if we should summarize messages to reduce context
     messages = state.messages
     if configuration.enable_memory_summarization and len(messages) > configuration.memory_summarization_threshold:
-        # Summarize messages to reduce token usage
-        summarized_messages = await summarize_messages(
+        # Run summarization as a task and await it: the condensed history
+        # must be used for this turn's model call. The shield means that if
+        # this turn is cancelled the summarization still finishes and its
+        # result lands in the summary cache, so the retry hits the cache
+        # instead of paying for the model call again.
+        summary_task = summarize_messages_start(
             messages=messages,
-            model=base_model,  # Use base model without tools for summarization
+            model=load_chat_model(_summarizer_model_name(configuration)),
             max_messages_to_keep=configuration.max_messages_to_keep,
             summary_prompt=MEMORY_SUMMARIZATION_PROMPT
         )
-        messages = summarized_messages
+        messages = await asyncio.shield(summary_task)
     
     # Get the model's response
     response = cast(
@@ -6,14 +6,23 @@ These tools are intended as free examples to get started. For production use,
 consider implementing more robust and specialized tools tailored to your needs.
 """
 
-from typing import Any, Callable, Dict, List, Optional, cast
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 import subprocess
 import shlex
 import asyncio
+import contextlib
+import functools
 import os
 import pathlib
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from asyncio.subprocess import Process
 
+import aiofiles
+import aiofiles.os
+import aiohttp
+
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import InjectedToolArg
@@ -22,11 +31,248 @@ from typing_extensions import Annotated
 from react_agent.configuration import Configuration
 from react_agent.SSHAgent import SSHAgent
 
-# Create a file operation lock to prevent concurrent file operations
-_file_lock = asyncio.Lock()
+# Per-path file locks: edits to different files proceed in parallel while
+# concurrent operations on the same file still serialize. Weak values let
+# locks for untouched paths be garbage collected.
+_file_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _lock_for(path: pathlib.Path) -> asyncio.Lock:
+    """Get the lock guarding a particular file, creating it on first use."""
+    key = str(path.resolve())
+    lock = _file_locks.get(key)
+    if lock is None:
+        lock = asyncio.Lock()
+        _file_locks[key] = lock
+    return lock
+
+
+# Cached working directory: the agent never chdirs, so one getcwd syscall
+# (and thread hop) per edit_file call is wasted work
+_cached_cwd: Optional[pathlib.Path] = None
+
+
+def _get_cwd() -> pathlib.Path:
+    """Return the process working directory, resolved once and cached."""
+    global _cached_cwd
+    if _cached_cwd is None:
+        _cached_cwd = pathlib.Path.cwd()
+    return _cached_cwd
+
+
+# Dedicated thread pool for blocking tool I/O (SSH channel reads, file
+# transfers). Keeping this off the default executor means a burst of tool
+# calls can't starve LangChain or other users of the shared 32-worker pool.
+_io_pool = ThreadPoolExecutor(
+    max_workers=min(64, (os.cpu_count() or 4) * 8),
+    thread_name_prefix="devopsagent-io",
+)
+
+
+def _run_blocking(fn, *args):
+    """Schedule a blocking call on the dedicated tool I/O pool."""
+    return asyncio.get_running_loop().run_in_executor(
+        _io_pool, functools.partial(fn, *args)
+    )
+
+
+# Shared HTTP session for local URL checks: holding one session keeps TCP
+# connections and TLS sessions warm across calls instead of forking curl
+_http_session: Optional[aiohttp.ClientSession] = None
+
+
+def _get_http_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP client session, creating it lazily."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300)
+        )
+    return _http_session
+
+
+# Global SSH connection storage: each entry pairs the agent with the
+# asyncio.Lock serializing send->read sequences, so concurrent tools can't
+# interleave commands on one channel and read each other's output
+_ssh_connections: Dict[str, Tuple[SSHAgent, asyncio.Lock]] = {}
+
+
+def _agent_lock(ssh: SSHAgent) -> asyncio.Lock:
+    """Return the channel lock for an agent, creating it on first use.
+
+    The lock lives on the agent instance rather than per connection_id:
+    the agent pool can hand the same live agent to several connection_ids,
+    and they all talk over one pty channel, so they must share one lock.
+    """
+    lock = getattr(ssh, "_channel_lock", None)
+    if lock is None:
+        lock = asyncio.Lock()
+        ssh._channel_lock = lock
+    return lock
+
+
+# Cap on a batch's joined command line: the pty's canonical input mode
+# rejects lines beyond ~4 KiB, and the completion sentinel appended by
+# _run_with_sentinel rides the same line, so stay well below it
+_MAX_BATCH_CHARS = 2048
+
+# Per-command cost of joining into a batch (the printf'd separator with its
+# 8-hex-char token)
+_BATCH_SEP_OVERHEAD = len(f" ; printf '\\n__SEP_%s__\\n' {'0' * 8} ; ")
+
+
+class _SSHBatcher:
+    """Coalesce bursts of SSH commands into one remote dispatch.
+
+    Commands enqueued within the batching window ride a single shell line,
+    separated by printf'd sentinel markers; the combined output is split back
+    so each caller's future resolves with just its own command's output. This
+    turns N round-trips plus N fixed waits into one of each for bursty
+    workloads.
+    """
+
+    def __init__(self, ssh: SSHAgent, lock: asyncio.Lock,
+                 max_batch_size: int = 16, max_queue_time: float = 0.05):
+        self.ssh = ssh
+        self.lock = lock
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._pending: List[tuple] = []
+        self._full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def submit(self, command: str, wait_time: float) -> str:
+        """Enqueue a command and wait for its slice of the batch output."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((command, wait_time, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_soon())
+        return await future
+
+    async def _flush_soon(self):
+        # Give other coroutines a short window to pile on, or go immediately
+        # once the batch is full
+        try:
+            await asyncio.wait_for(self._full.wait(), timeout=self.max_queue_time)
+        except asyncio.TimeoutError:
+            pass
+        self._full.clear()
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
 
-# Global SSH connection storage
-_ssh_connections: Dict[str, SSHAgent] = {}
+        try:
+            for group in self._split_by_length(batch):
+                await self._dispatch_group(group)
+        finally:
+            # Submissions that arrived while we were dispatching won't have
+            # created a new flusher (this task wasn't done yet), so re-arm
+            # one for them
+            if self._pending:
+                self._flusher = asyncio.create_task(self._flush_soon())
+
+    @staticmethod
+    def _split_by_length(batch: List[tuple]) -> List[List[tuple]]:
+        """Split a batch into groups whose joined line stays under the cap.
+
+        A single command already over the cap forms its own group and goes
+        out alone, exactly as it would have without batching.
+        """
+        groups = []
+        current: List[tuple] = []
+        length = 0
+        for item in batch:
+            extra = len(item[0]) + (_BATCH_SEP_OVERHEAD if current else 0)
+            if current and length + extra > _MAX_BATCH_CHARS:
+                groups.append(current)
+                current, length = [item], len(item[0])
+            else:
+                current.append(item)
+                length += extra
+        groups.append(current)
+        return groups
+
+    async def _dispatch_group(self, batch: List[tuple]) -> None:
+        wait_time = max(item[1] for item in batch)
+        try:
+            if len(batch) == 1:
+                output = await self._dispatch(batch[0][0], wait_time)
+                parts = [output]
+            else:
+                # The separator is printf'd from a format string so the
+                # terminal echo of the command line can never contain the
+                # literal marker
+                token = uuid.uuid4().hex[:8]
+                separator = f"__SEP_{token}__"
+                joined = f" ; printf '\\n__SEP_%s__\\n' {token} ; ".join(
+                    item[0] for item in batch
+                )
+                output = await self._dispatch(joined, wait_time)
+                parts = output.split(separator)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (_, _, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(parts[i].strip('\n') if i < len(parts) else "")
+
+    async def _dispatch(self, command: str, wait_time: float) -> str:
+        async with self.lock:
+            return await _run_with_sentinel(self.ssh, command, wait_time)
+
+
+def _agent_batcher(ssh: SSHAgent) -> _SSHBatcher:
+    """Return the agent's batcher, creating it on first use.
+
+    Like the channel lock, the batcher is stored on the agent instance so
+    every connection_id sharing a pooled agent feeds the same batch queue;
+    it is torn down with the agent, so no per-id cleanup is needed.
+    """
+    batcher = getattr(ssh, "_tools_batcher", None)
+    if batcher is None:
+        batcher = _SSHBatcher(ssh, _agent_lock(ssh))
+        ssh._tools_batcher = batcher
+    return batcher
+
+
+async def _run_with_sentinel(ssh: SSHAgent, command: str, timeout: float) -> str:
+    """Run a remote command, returning as soon as its completion marker appears.
+
+    Appends a printf of a unique marker to the command and polls the output
+    buffer with exponential backoff (20ms doubling to 500ms) until the marker
+    shows up, so fast commands return in tens of milliseconds instead of
+    sleeping the full timeout, while slow ones still get the whole window.
+    The marker is printf'd from a format string so the echoed command line
+    can never contain the literal marker.
+    """
+    token = uuid.uuid4().hex[:12]
+    marker = f"__AGENT_DONE_{token}__"
+    await _run_blocking(
+        ssh.send_command,
+        f"{command} ; printf '\\n__AGENT_DONE_%s__\\n' {token}"
+    )
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = 0.02
+    collected = ""
+    while True:
+        collected += await _run_blocking(ssh.get_output)
+        index = collected.find(marker)
+        if index != -1:
+            return collected[:index].rstrip('\n')
+        if loop.time() >= deadline:
+            # Timed out waiting for the marker; return what arrived so far
+            return collected
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
 
 
 async def search(
@@ -44,53 +290,95 @@ async def search(
     return cast(list[dict[str, Any]], result)
 
 
+@functools.lru_cache(maxsize=256)
+def _split_cmd(cmd: str) -> tuple:
+    """Tokenize a shell command, memoizing repeated probe commands.
+
+    Agents tend to re-run the same short commands (uptime, systemctl
+    status ...), so caching the parse skips the tokenizer on repeats. The
+    tuple is immutable, making the cached value safe to hand out directly.
+    """
+    return tuple(shlex.split(cmd))
+
+
+class _CollectProtocol(asyncio.SubprocessProtocol):
+    """Collect subprocess output directly into bytearrays.
+
+    Bypasses the StreamReader/StreamWriter layer for the common case of
+    "run to completion, capture everything", so bytes go from the pipe
+    transport straight into a growable buffer.
+    """
+
+    def __init__(self, exit_future: asyncio.Future):
+        self.exit_future = exit_future
+        self.out = bytearray()
+        self.err = bytearray()
+
+    def pipe_data_received(self, fd: int, data: bytes) -> None:
+        (self.out if fd == 1 else self.err).extend(data)
+
+    def process_exited(self) -> None:
+        if not self.exit_future.done():
+            self.exit_future.set_result(True)
+
+
 async def run_shell_command(
     command: str, 
     *,
     responses: List[dict] = None,
     timeout: int = 30,
+    buffer_limit: int = 1 << 20,
     config: Annotated[RunnableConfig, InjectedToolArg]
 ) -> str:
     """Execute a Linux shell command and return the output.
-    
+
     This function executes a Linux shell command on local machine and returns the output.
     It can handle interactive commands that prompt for user input.
-    
+
     Args:
         command: The shell command to execute
-        responses: List of dict with 'prompt' and 'response' keys for interactive commands
+        responses: List of dict with 'prompt' and 'response' keys for interactive commands.
+            Entries are matched against stdout strictly in list order: each
+            prompt is awaited before the next entry is considered, so list
+            them in the order the command will ask, and a prompt that never
+            appears stalls the remaining entries until the timeout
         timeout: Maximum execution time in seconds
+        buffer_limit: Stream buffer size in bytes for command output
     """
     try:
         # Parse the command properly
-        args = shlex.split(command)
+        args = _split_cmd(command)
         
         if not responses:
-            # Non-interactive mode - simpler execution
-            # Create subprocess asynchronously
-            process = await asyncio.create_subprocess_exec(
+            # Non-interactive mode - collect output straight off the pipe
+            # transports, skipping the StreamReader layer entirely
+            loop = asyncio.get_running_loop()
+            exit_future = loop.create_future()
+            transport, protocol = await loop.subprocess_exec(
+                lambda: _CollectProtocol(exit_future),
                 *args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stdin=None
             )
-            
+
             # Set a timeout for the command execution
             try:
-                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
-                
-                # Decode bytes to string
-                output = stdout.decode('utf-8')
-                error_output = stderr.decode('utf-8')
-                
-                # Combine stdout and stderr if needed
-                if error_output:
-                    output += f"\nError output:\n{error_output}"
-                    
-                return output
+                await asyncio.wait_for(exit_future, timeout=timeout)
             except asyncio.TimeoutError:
                 # Make sure to terminate the process if it times out
-                process.kill()
+                transport.close()
                 return f"Command timed out after {timeout} seconds"
+
+            transport.close()
+
+            # Decode bytes to string
+            output = bytes(protocol.out).decode('utf-8')
+            error_output = bytes(protocol.err).decode('utf-8')
+
+            # Combine stdout and stderr if needed
+            if error_output:
+                output += f"\nError output:\n{error_output}"
+
+            return output
         else:
             # Interactive mode - handle prompts and responses
             # Create subprocess with pipes for stdin, stdout, stderr
@@ -98,91 +386,108 @@ async def run_shell_command(
                 *args,
                 stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                limit=buffer_limit
             )
-            
+
             # Track all output
             all_output = []
             remaining_responses = responses.copy()
-            process_output = ""
-            
+
+            # Drain stderr concurrently: a child writing more than the pipe
+            # buffer (64 KB) to stderr would otherwise block forever while
+            # this coroutine waits on stdout
+            stderr_task = asyncio.create_task(process.stderr.read())
+
             # Set up timeout
-            end_time = asyncio.get_event_loop().time() + timeout
-            
-            # Run the interactive session
-            while process.returncode is None:
-                # Check if we've exceeded the timeout
-                if asyncio.get_event_loop().time() > end_time:
+            loop = asyncio.get_event_loop()
+            end_time = loop.time() + timeout
+
+            # Answer each expected prompt in order: readuntil() blocks until
+            # the prompt actually arrives instead of polling stdout on a
+            # fixed 0.5s tick, so responses go out as soon as prompts appear
+            eof = False
+            while remaining_responses and not eof:
+                prompt = remaining_responses[0]['prompt']
+                response = remaining_responses[0]['response']
+                remaining_time = end_time - loop.time()
+                if remaining_time <= 0:
                     process.kill()
+                    with contextlib.suppress(ProcessLookupError):
+                        await process.wait()
+                    stderr_task.cancel()
                     return f"Interactive command timed out after {timeout} seconds"
-                
-                # Use a short timeout for reading to check for prompts
+
                 try:
-                    # Read a chunk from stdout without blocking too long
                     chunk = await asyncio.wait_for(
-                        process.stdout.read(1024),
-                        timeout=0.5
+                        process.stdout.readuntil(prompt.encode('utf-8')),
+                        timeout=remaining_time
                     )
-                    
-                    if not chunk:  # EOF reached
-                        break
-                    
-                    # Decode and store the output
-                    chunk_str = chunk.decode('utf-8')
-                    process_output += chunk_str
-                    all_output.append(chunk_str)
-                    
-                    # Check if we need to respond to any prompts
-                    for response_item in remaining_responses[:]:
-                        prompt = response_item['prompt']
-                        response = response_item['response']
-                        
-                        if prompt in process_output:
-                            # Found a prompt that needs a response
-                            if process.stdin.is_closing():
-                                return "Error: Process stdin closed unexpectedly"
-                                
-                            # Send the response
-                            process.stdin.write(f"{response}\n".encode('utf-8'))
-                            await process.stdin.drain()
-                            
-                            # Add the response to the output log
-                            all_output.append(f"[Sent: {response}]\n")
-                            
-                            # Remove this response from the list to avoid sending again
-                            remaining_responses.remove(response_item)
-                            
-                            # Reset the output buffer after sending a response
-                            process_output = ""
-                            
                 except asyncio.TimeoutError:
-                    # No output for a while, just continue the loop
-                    continue
-                
-                # Check if the process has ended
-                if process.returncode is not None:
+                    process.kill()
+                    with contextlib.suppress(ProcessLookupError):
+                        await process.wait()
+                    stderr_task.cancel()
+                    return f"Interactive command timed out after {timeout} seconds"
+                except asyncio.IncompleteReadError as e:
+                    # EOF before the prompt appeared; keep the partial output
+                    if e.partial:
+                        all_output.append(e.partial.decode('utf-8', errors='replace'))
+                    eof = True
                     break
-            
+                except asyncio.LimitOverrunError:
+                    # Buffer filled without the prompt; flush it and re-arm
+                    chunk = await process.stdout.read(64 * 1024)
+                    all_output.append(chunk.decode('utf-8', errors='replace'))
+                    continue
+
+                all_output.append(chunk.decode('utf-8', errors='replace'))
+
+                if process.stdin.is_closing():
+                    stderr_task.cancel()
+                    return "Error: Process stdin closed unexpectedly"
+
+                # Send the response
+                process.stdin.write(f"{response}\n".encode('utf-8'))
+                await process.stdin.drain()
+
+                # Add the response to the output log
+                all_output.append(f"[Sent: {response}]\n")
+                remaining_responses.pop(0)
+
             # Collect any final output and close stdin
             if process.stdin and not process.stdin.is_closing():
                 process.stdin.close()
-            
-            # Wait for the process to complete
+
+            # Wait for the process to complete (stderr is read by its own
+            # task, so only stdout and the exit status are awaited here)
             try:
-                final_stdout, final_stderr = await asyncio.wait_for(
-                    process.communicate(), 
-                    timeout=max(1, end_time - asyncio.get_event_loop().time())
+                remaining_time = max(1, end_time - loop.time())
+                final_stdout = await asyncio.wait_for(
+                    process.stdout.read(), timeout=remaining_time
                 )
-                
+                final_stderr = await asyncio.wait_for(
+                    stderr_task, timeout=max(1, end_time - loop.time())
+                )
+                # The exit wait is bounded too: stdout hitting EOF doesn't
+                # guarantee the child exits (it may linger after closing its
+                # pipes), and an unbounded wait would hang the tool
+                await asyncio.wait_for(
+                    process.wait(), timeout=max(1, end_time - loop.time())
+                )
+
                 # Add any final output
                 if final_stdout:
-                    all_output.append(final_stdout.decode('utf-8'))
+                    all_output.append(final_stdout.decode('utf-8', errors='replace'))
                 if final_stderr:
-                    all_output.append(f"Error output:\n{final_stderr.decode('utf-8')}")
+                    all_output.append(f"Error output:\n{final_stderr.decode('utf-8', errors='replace')}")
             except asyncio.TimeoutError:
                 process.kill()
+                with contextlib.suppress(ProcessLookupError):
+                    await process.wait()
+                stderr_task.cancel()
                 all_output.append(f"Process killed after timeout ({timeout}s)")
-            
+
             # Return the combined output
             return "".join(all_output)
             
@@ -196,92 +501,94 @@ async def edit_file(
     mode: str = "write",
     read_type: str = "full",
     num_chars: int = 1000,
-    *, 
+    max_bytes: int = 2 * 1024 * 1024,
+    *,
     config: Annotated[RunnableConfig, InjectedToolArg]
 ) -> str:
     """Edit or read a file on the local filesystem.
-    
+
     Args:
         file_path: Path to the file to edit or read
         content: Content to write to the file (ignored if mode is 'read')
         mode: Operation mode - 'write', 'append', or 'read'
         read_type: For read mode - 'full', 'head', or 'tail'
         num_chars: Number of characters to read for head/tail operations
+        max_bytes: For full reads - files larger than this return a head+tail preview
     """
     try:
         # Ensure we're not trying to access files outside current directory
         path = pathlib.Path(file_path)
         if path.is_absolute():
-            # Get current working directory using asyncio.to_thread to avoid blocking
-            cwd = await asyncio.to_thread(pathlib.Path.cwd)
             # Make it relative to a safe base directory
-            path = cwd / pathlib.Path(file_path).relative_to(pathlib.Path(file_path).anchor)
+            path = _get_cwd() / pathlib.Path(file_path).relative_to(pathlib.Path(file_path).anchor)
         
         # Create parent directories if they don't exist
         if mode in ["write", "append"]:
-            # Move the blocking makedirs call to a separate thread
-            await asyncio.to_thread(
-                lambda p: os.makedirs(os.path.dirname(p) if os.path.dirname(p) else ".", exist_ok=True),
-                path
-            )
-            
+            parent = os.path.dirname(str(path)) or "."
+            await aiofiles.os.makedirs(parent, exist_ok=True)
+
         if mode == "read":
             # Reading a file
             # Check file existence in a non-blocking way
-            exists = await asyncio.to_thread(lambda p: p.exists(), path)
+            exists = await aiofiles.os.path.exists(path)
             if not exists:
                 return f"Error: File {file_path} does not exist"
-                
+
             # Use async file IO to avoid blocking
-            async with _file_lock:
-                # Use asyncio.to_thread for file operations to avoid blocking
+            async with _lock_for(path):
                 if read_type == "full":
+                    # Bound peak memory: oversized files get a head+tail
+                    # preview instead of being loaded whole
+                    size = await aiofiles.os.path.getsize(path)
+                    if size > max_bytes:
+                        window = max_bytes // 2
+                        async with aiofiles.open(path, 'rb', buffering=0) as f:
+                            head = await f.read(window)
+                            await f.seek(size - window, os.SEEK_SET)
+                            tail = await f.read(window)
+                        truncated = size - len(head) - len(tail)
+                        return (
+                            head.decode('utf-8', errors='replace')
+                            + f"\n...[truncated {truncated} bytes]...\n"
+                            + tail.decode('utf-8', errors='replace')
+                        )
                     # Read the entire file
-                    file_content = await asyncio.to_thread(lambda p: p.read_text(), path)
-                    return file_content
+                    async with aiofiles.open(path, 'r') as f:
+                        return await f.read()
                 elif read_type == "head":
-                    # Read only the beginning of the file
-                    def read_head(p, n):
-                        with open(p, 'r') as f:
-                            return f.read(n)
-                    head_content = await asyncio.to_thread(read_head, path, num_chars)
+                    # Read only the beginning of the file; unbuffered binary
+                    # reads exactly the window with no read-ahead
+                    async with aiofiles.open(path, 'rb', buffering=0) as f:
+                        data = await f.read(num_chars)
+                    head_content = data.decode('utf-8', errors='replace')
                     return f"First {num_chars} characters of {file_path}:\n{head_content}"
                 elif read_type == "tail":
-                    # Read only the end of the file
-                    def read_tail(p, n):
-                        with open(p, 'r') as f:
-                            # Get file size
-                            f.seek(0, os.SEEK_END)
-                            size = f.tell()
-                            # Seek to the appropriate position
-                            f.seek(max(0, size - n), os.SEEK_SET)
-                            return f.read(n)
-                    tail_content = await asyncio.to_thread(read_tail, path, num_chars)
+                    # Read only the tail window; binary seek avoids pulling
+                    # the whole file through a text-mode buffer
+                    async with aiofiles.open(path, 'rb', buffering=0) as f:
+                        size = await f.seek(0, os.SEEK_END)
+                        await f.seek(max(0, size - num_chars), os.SEEK_SET)
+                        data = await f.read(num_chars)
+                    tail_content = data.decode('utf-8', errors='replace')
                     return f"Last {num_chars} characters of {file_path}:\n{tail_content}"
                 else:
                     return f"Error: Invalid read_type '{read_type}'. Use 'full', 'head', or 'tail'"
-                
+
         elif mode == "write":
             # Writing to a file (overwrites existing content)
-            async with _file_lock:
-                await asyncio.to_thread(lambda p, c: p.write_text(c), path, content)
+            async with _lock_for(path):
+                async with aiofiles.open(path, 'w') as f:
+                    await f.write(content)
                 return f"Successfully wrote {len(content)} characters to {file_path}"
-                
+
         elif mode == "append":
-            # Appending to a file
-            exists = await asyncio.to_thread(lambda p: p.exists(), path)
-            if exists:
-                async with _file_lock:
-                    # Read existing content
-                    existing_content = await asyncio.to_thread(lambda p: p.read_text(), path)
-                    # Append new content
-                    await asyncio.to_thread(lambda p, c: p.write_text(c), path, existing_content + content)
-                    return f"Successfully appended {len(content)} characters to {file_path}"
-            else:
-                # If file doesn't exist, create it with the content
-                async with _file_lock:
-                    await asyncio.to_thread(lambda p, c: p.write_text(c), path, content)
-                    return f"File {file_path} did not exist. Created it with {len(content)} characters"
+            # Appending to a file: 'a' mode lets the kernel position the
+            # write and creates the file if needed, so only the new content
+            # is written instead of rewriting the whole file
+            async with _lock_for(path):
+                async with aiofiles.open(path, 'a') as f:
+                    await f.write(content)
+                return f"Successfully appended {len(content)} characters to {file_path}"
         else:
             return f"Error: Invalid mode '{mode}'. Use 'read', 'write', or 'append'"
             
@@ -317,13 +624,23 @@ async def ssh_connect(
     try:
         # Check if we already have a connection with this ID
         if connection_id in _ssh_connections:
-            # Close the existing connection first
-            await asyncio.to_thread(lambda: _ssh_connections[connection_id].close())
+            existing, _ = _ssh_connections[connection_id]
+            if (existing.hostname, existing.port, existing.username,
+                    existing.password, existing.pkey_path) == (
+                        hostname, port, username,
+                        password if password else None,
+                        key_path if key_path else None) \
+                    and await _run_blocking(existing.is_alive):
+                # Same target, same credentials, still live - nothing to redo
+                return f"SSH connection established to {hostname}:{port} as {username} (ID: {connection_id})"
+            # Stale or retargeted - release it before reconnecting
+            await _run_blocking(existing.close)
             del _ssh_connections[connection_id]
-        
-        # Create the SSH connection in a non-blocking way
-        ssh_agent = await asyncio.to_thread(
-            lambda: SSHAgent(
+
+        # Go through the agent pool so repeat connects to the same target
+        # reuse the live connection instead of paying a fresh handshake
+        ssh_agent = await _run_blocking(
+            lambda: SSHAgent.connect(
                 hostname=hostname,
                 port=port,
                 username=username,
@@ -332,8 +649,9 @@ async def ssh_connect(
             )
         )
         
-        # Store the connection for later use
-        _ssh_connections[connection_id] = ssh_agent
+        # Store the connection alongside its channel lock; the lock lives on
+        # the agent so ids pooled onto the same agent share it
+        _ssh_connections[connection_id] = (ssh_agent, _agent_lock(ssh_agent))
         
         return f"SSH connection established to {hostname}:{port} as {username} (ID: {connection_id})"
     except Exception as e:
@@ -363,18 +681,11 @@ async def ssh_execute(
         if connection_id not in _ssh_connections:
             return f"Error: No SSH connection found with ID '{connection_id}'. Use ssh_connect first."
         
-        ssh = _ssh_connections[connection_id]
-        
-        # Send the command in a non-blocking way
-        await asyncio.to_thread(lambda: ssh.send_command(command))
-        
-        # Wait for the command to execute
-        await asyncio.sleep(wait_time)
-        
-        # Get the output in a non-blocking way
-        output = await asyncio.to_thread(lambda: ssh.get_output())
-        
-        return output
+        ssh, _ = _ssh_connections[connection_id]
+
+        # Route through the agent's batcher so bursts of commands share one
+        # dispatch and one wait, regardless of which connection_id sent them
+        return await _agent_batcher(ssh).submit(command, wait_time)
     except Exception as e:
         return f"Error executing SSH command: {str(e)}"
 
@@ -404,49 +715,26 @@ async def ssh_read_file(
         if connection_id not in _ssh_connections:
             return f"Error: No SSH connection found with ID '{connection_id}'. Use ssh_connect first."
         
-        ssh = _ssh_connections[connection_id]
-        
+        ssh, lock = _ssh_connections[connection_id]
+
         if read_type == "full":
             # Read the entire file using the agent's method
-            content = await asyncio.to_thread(lambda: ssh.read_file(remote_path))
+            async with lock:
+                content = await _run_blocking(ssh.read_file, remote_path)
             return content
         elif read_type == "head":
             # Use head command to get first part of file
-            head_cmd = f"head -c {num_chars} {remote_path}"
-            await asyncio.to_thread(lambda: ssh.send_command(head_cmd))
-            await asyncio.sleep(1)  # Wait for command to complete
-            content = await asyncio.to_thread(lambda: ssh.get_output())
+            head_cmd = f"head -c {num_chars} {shlex.quote(remote_path)}"
+            async with lock:
+                content = await _run_with_sentinel(ssh, head_cmd, 5.0)
             return f"First {num_chars} characters of {remote_path}:\n{content}"
         elif read_type == "tail":
-            # Use tail command to get last part of file
-            # First get file size to determine tail strategy
-            size_cmd = f"wc -c < {remote_path}"
-            await asyncio.to_thread(lambda: ssh.send_command(size_cmd))
-            await asyncio.sleep(1)
-            size_output = await asyncio.to_thread(lambda: ssh.get_output())
-            
-            try:
-                # Parse file size
-                size = int(size_output.strip())
-                
-                # Use tail command with appropriate option
-                if size > num_chars:
-                    tail_cmd = f"tail -c {num_chars} {remote_path}"
-                else:
-                    # If file is smaller than requested chars, just cat the whole file
-                    tail_cmd = f"cat {remote_path}"
-                    
-                await asyncio.to_thread(lambda: ssh.send_command(tail_cmd))
-                await asyncio.sleep(1)
-                content = await asyncio.to_thread(lambda: ssh.get_output())
-                return f"Last {min(num_chars, size)} characters of {remote_path}:\n{content}"
-            except ValueError:
-                # If size parsing fails, use a direct tail command
-                tail_cmd = f"tail -c {num_chars} {remote_path}"
-                await asyncio.to_thread(lambda: ssh.send_command(tail_cmd))
-                await asyncio.sleep(1)
-                content = await asyncio.to_thread(lambda: ssh.get_output())
-                return f"Last {num_chars} characters of {remote_path}:\n{content}"
+            # tail -c already returns "up to" num_chars bytes, so one
+            # round trip suffices - no need to probe the size first
+            tail_cmd = f"tail -c {num_chars} {shlex.quote(remote_path)}"
+            async with lock:
+                content = await _run_with_sentinel(ssh, tail_cmd, 5.0)
+            return f"Last up to {num_chars} characters of {remote_path}:\n{content}"
         else:
             return f"Error: Invalid read_type '{read_type}'. Use 'full', 'head', or 'tail'"
     except Exception as e:
@@ -476,11 +764,12 @@ async def ssh_write_file(
         if connection_id not in _ssh_connections:
             return f"Error: No SSH connection found with ID '{connection_id}'. Use ssh_connect first."
         
-        ssh = _ssh_connections[connection_id]
-        
+        ssh, lock = _ssh_connections[connection_id]
+
         # Write the file in a non-blocking way
-        result = await asyncio.to_thread(lambda: ssh.write_file(remote_path, content))
-        
+        async with lock:
+            result = await _run_blocking(ssh.write_file, remote_path, content)
+
         return result
     except Exception as e:
         return f"Error writing remote file: {str(e)}"
@@ -506,11 +795,12 @@ async def ssh_disconnect(
             return f"No SSH connection found with ID '{connection_id}'"
         
         # Close the connection in a non-blocking way
-        await asyncio.to_thread(lambda: _ssh_connections[connection_id].close())
+        await _run_blocking(_ssh_connections[connection_id][0].close)
         
-        # Remove from the dictionary
+        # Remove from the dictionary; the agent's batcher and lock go away
+        # with the agent once its last user has closed it
         del _ssh_connections[connection_id]
-        
+
         return f"SSH connection closed (ID: {connection_id})"
     except Exception as e:
         return f"Error closing SSH connection: {str(e)}"
@@ -538,11 +828,13 @@ async def ssh_check_output(
         if connection_id not in _ssh_connections:
             return f"Error: No SSH connection found with ID '{connection_id}'. Use ssh_connect first."
         
-        ssh = _ssh_connections[connection_id]
-        
-        # Get the output in a non-blocking way
-        output = await asyncio.to_thread(lambda: ssh.get_output())
-        
+        ssh, lock = _ssh_connections[connection_id]
+
+        # Get the output in a non-blocking way; the lock keeps this from
+        # draining output a concurrent send->read sequence is waiting on
+        async with lock:
+            output = await _run_blocking(ssh.get_output)
+
         return output if output else "No new output available."
     except Exception as e:
         return f"Error checking SSH output: {str(e)}"
@@ -560,11 +852,12 @@ async def curl_check_url(
     *,
     config: Annotated[RunnableConfig, InjectedToolArg]
 ) -> str:
-    """Check a remote URL using curl.
-    
-    This tool makes HTTP requests to remote URLs using curl. If an SSH connection_id is provided,
-    it runs the curl command on the remote server, otherwise it runs locally.
-    
+    """Check a remote URL over HTTP.
+
+    If an SSH connection_id is provided the check runs as a curl command on
+    the remote server; otherwise the request is made locally through a shared
+    HTTP session, reusing connections across calls.
+
     Args:
         url: The URL to request
         method: HTTP method to use (GET, POST, PUT, DELETE, etc.)
@@ -576,99 +869,75 @@ async def curl_check_url(
         connection_id: Optional SSH connection ID to run curl on remote server
     """
     try:
-        # Build the curl command
-        curl_cmd = ["curl", "-s"]
-        
-        # Add method if not GET
-        if method != "GET":
-            curl_cmd.extend(["-X", method])
-            
-        # Add headers
-        if headers:
-            for header in headers:
-                curl_cmd.extend(["-H", header])
-                
-        # Add data if provided
-        if data:
-            curl_cmd.extend(["-d", data])
-            
-        # Add timeout
-        curl_cmd.extend(["--max-time", str(timeout)])
-        
-        # Add follow redirects option
-        if follow_redirects:
-            curl_cmd.append("-L")
-            
-        # Add output options
-        if output_type == "headers":
-            curl_cmd.append("-I")  # Only fetch headers
-        elif output_type == "status":
-            curl_cmd.extend(["-o", "/dev/null", "-w", "%{http_code}"])  # Only return status code
-        
-        # Add the URL
-        curl_cmd.append(url)
-        
-        # Convert to string command
-        cmd_str = " ".join([shlex.quote(str(arg)) for arg in curl_cmd])
-        
-        # Execute the command (locally or via SSH)
+        # Execute the command (remotely via SSH, or locally in-process)
         if connection_id:
             # Check if the connection exists
             if connection_id not in _ssh_connections:
                 return f"Error: No SSH connection found with ID '{connection_id}'. Use ssh_connect first."
-            
-            ssh = _ssh_connections[connection_id]
-            
-            # Send the command
-            await asyncio.to_thread(lambda: ssh.send_command(cmd_str))
-            
-            # Wait for completion with a bit of buffer time
+
+            ssh, lock = _ssh_connections[connection_id]
+
+            # Build the curl command; only this path needs it
+            curl_cmd = ["curl", "-s"]
+            if method != "GET":
+                curl_cmd.extend(["-X", method])
+            if headers:
+                for header in headers:
+                    curl_cmd.extend(["-H", header])
+            if data:
+                curl_cmd.extend(["-d", data])
+            curl_cmd.extend(["--max-time", str(timeout)])
+            if follow_redirects:
+                curl_cmd.append("-L")
+            if output_type == "headers":
+                curl_cmd.append("-I")  # Only fetch headers
+            elif output_type == "status":
+                curl_cmd.extend(["-o", "/dev/null", "-w", "%{http_code}"])  # Only return status code
+            curl_cmd.append(url)
+
+            cmd_str = shlex.join(map(str, curl_cmd))
+
+            # Wait on a completion sentinel instead of a staged sleep, so
+            # fast requests return immediately
             wait_time = min(timeout + 2, 120)  # Cap at 2 minutes
-            await asyncio.sleep(wait_time * 0.2)  # Start with partial wait
-            
-            # Get initial output
-            output = await asyncio.to_thread(lambda: ssh.get_output())
-            
-            # If output seems incomplete, wait more
-            if not output or output.strip().endswith("..."):
-                await asyncio.sleep(wait_time * 0.8)
-                more_output = await asyncio.to_thread(lambda: ssh.get_output())
-                output += more_output
-            
-            return output
+            async with lock:
+                return await _run_with_sentinel(ssh, cmd_str, wait_time)
         else:
-            # Execute locally
-            # Create subprocess asynchronously
-            process = await asyncio.create_subprocess_exec(
-                *curl_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Set a timeout for the command execution
+            # Execute locally over the shared session: no process fork, and
+            # repeat checks against the same host reuse the connection
+            header_dict = None
+            if headers:
+                header_dict = dict(
+                    (k.strip(), v.strip())
+                    for k, v in (h.split(":", 1) for h in headers)
+                )
+
+            session = _get_http_session()
             try:
-                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout + 5)
-                
-                # Decode bytes to string
-                output = stdout.decode('utf-8')
-                error_output = stderr.decode('utf-8')
-                
-                # Check for errors
-                if process.returncode != 0:
-                    if error_output:
-                        return f"Curl error: {error_output}"
-                    return f"Curl command failed with exit code {process.returncode}"
-                
-                # Return the appropriate output
-                if error_output and not output:
-                    return error_output
-                return output
-                
+                async with session.request(
+                    method,
+                    url,
+                    headers=header_dict,
+                    data=data,
+                    allow_redirects=follow_redirects,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as response:
+                    if output_type == "status":
+                        return str(response.status)
+                    elif output_type == "headers":
+                        return "\n".join(
+                            f"{name}: {value}"
+                            for name, value in response.headers.items()
+                        )
+                    else:
+                        # 'full' and 'body' both return the response body,
+                        # matching what curl -s printed before
+                        return await response.text(errors="replace")
             except asyncio.TimeoutError:
-                # Make sure to terminate the process if it times out
-                process.kill()
                 return f"Request timed out after {timeout} seconds"
-    
+            except aiohttp.ClientError as e:
+                return f"HTTP request error: {str(e)}"
+
     except Exception as e:
         return f"Error executing curl request: {str(e)}"
 
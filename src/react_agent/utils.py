@@ -1,128 +1,635 @@
 """Utility & helper functions."""
 
-from langchain.chat_models import init_chat_model
-from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage
-from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
+import os
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from langchain_anthropic import ChatAnthropic
 from langchain_core.language_models import BaseLanguageModel
-from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
 
-import asyncio
+from react_agent.prompts import MEMORY_SUMMARIZATION_PROMPT
+
+
+# Memoized text for messages with structured content, keyed by id(msg).
+# The memo lives outside the message because additional_kwargs is real
+# message state: it is serialized into checkpoints and provider payloads,
+# so caching there leaks into both. Message objects aren't hashable (and
+# so can't key a WeakKeyDictionary), hence the id key; each entry holds a
+# weakref whose finalizer evicts it, which also guards against a recycled
+# id colliding with a dead entry.
+_message_text_cache: Dict[int, tuple] = {}
+
+
+def _remember_message_text(msg: BaseMessage, text: str) -> None:
+    key = id(msg)
+    try:
+        ref = weakref.ref(msg, lambda _ref, _key=key: _message_text_cache.pop(_key, None))
+    except TypeError:
+        # Not weak-referenceable; skip memoization rather than pin the message
+        return
+    _message_text_cache[key] = (ref, text)
 
-import os
 
 def get_message_text(msg: BaseMessage) -> str:
     """Get the text content of a message."""
     content = msg.content
-    if isinstance(content, str):
+    # Plain strings are the overwhelmingly common case; return with zero
+    # allocations before touching the structured-content paths
+    if type(content) is str:
         return content
-    elif isinstance(content, dict):
-        return content.get("text", "")
+    if not content:
+        return ""
+
+    # Structured content is rebuilt into a string on every call, and the
+    # token-budget check does this per message per turn - memoize it,
+    # since content doesn't change after creation
+    entry = _message_text_cache.get(id(msg))
+    if entry is not None and entry[0]() is msg:
+        return entry[1]
+
+    if isinstance(content, dict):
+        text = content.get("text", "")
     else:
-        txts = [c if isinstance(c, str) else (c.get("text") or "") for c in content]
-        return "".join(txts).strip()
+        # List-of-blocks path: feed the generator straight to join instead
+        # of materializing an intermediate list of fragments
+        text = "".join(
+            c if type(c) is str else (c.get("text") or "") for c in content
+        ).strip()
+
+    _remember_message_text(msg, text)
+    return text
+
+
+def _make_anthropic(model_name: str) -> BaseLanguageModel:
+    """Construct an Anthropic chat model."""
+    from langchain_anthropic import ChatAnthropic
+
+    anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
+    if not anthropic_api_key:
+        raise ValueError("ANTHROPIC_API_KEY environment variable is required for Anthropic models")
+
+    return ChatAnthropic(model=model_name)
+
+
+def _make_openai(model_name: str) -> BaseLanguageModel:
+    """Construct an OpenAI chat model."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=model_name)
+
 
+# Provider dispatch table: adding a provider means adding a factory entry,
+# not growing an if/elif chain in load_chat_model
+_PROVIDERS: Dict[str, Any] = {
+    "anthropic": _make_anthropic,
+    "openai": _make_openai,
+}
 
+
+@lru_cache(maxsize=16)
 def load_chat_model(
     model_name_or_path: str = "anthropic/claude-3-5-sonnet-20240620",
 ) -> BaseLanguageModel:
     """Load a chat model.
 
+    Instances are cached per model string: rebuilding the provider client on
+    every call would recreate its HTTP connection pool and redo auth setup.
+    Provider SDKs are imported lazily so a process only loads the one it
+    actually uses; with the cache, the import cost is paid once.
+
     Args:
         model_name_or_path: Name of the model to load, in the format "provider/model-name"
 
     Returns:
         A language model ready for chat.
     """
-    provider, model_name = model_name_or_path.split("/", 1)
+    provider, sep, model_name = model_name_or_path.partition("/")
+    if not sep:
+        raise ValueError(
+            f"Invalid model string '{model_name_or_path}': expected provider/model-name"
+        )
 
-    if provider == "anthropic":
-        import os
-        anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-        if not anthropic_api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable is required for Anthropic models")
-    
-        return ChatAnthropic(model=model_name)
-    elif provider == "openai":
-        return ChatOpenAI(model=model_name)
-    else:
+    factory = _PROVIDERS.get(provider)
+    if factory is None:
         raise ValueError(f"Unsupported provider: {provider}")
+    return factory(model_name)
+
+
+# Cache of summarization results keyed by a digest of the summarized
+# prefix. Agent loops re-summarize near-identical histories turn after
+# turn, and a cache hit replaces an LLM round trip (hundreds of ms to
+# seconds) with a dict lookup.
+_summary_cache: "OrderedDict[str, AIMessage]" = OrderedDict()
+_SUMMARY_CACHE_MAX = 128
+
+# Token counting for the summarization trigger. tiktoken gives exact counts
+# when available; the fallback uses the ~4 chars/token rule of thumb, which
+# is plenty accurate for a threshold decision.
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+
+    def _token_len(text: str) -> int:
+        return len(_ENCODING.encode(text))
+except ImportError:
+    def _token_len(text: str) -> int:
+        return len(text) // 4
+
+
+def _prefix_exceeds_budget(messages: List[BaseMessage], budget: int) -> bool:
+    """Check whether a message prefix is over the token budget, counting lazily."""
+    total = 0
+    for msg in messages:
+        total += _token_len(get_message_text(msg))
+        if total >= budget:
+            return True
+    return False
+
+
+def _summary_cache_key(messages: List[BaseMessage], summary_prompt: str) -> str:
+    """Build a digest identifying a summarization request."""
+    hasher = hashlib.sha256(summary_prompt.encode("utf-8"))
+    for msg in messages:
+        hasher.update(b"\x00")
+        hasher.update(get_message_text(msg).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _truncate_tool_message(msg: BaseMessage, max_chars: int) -> BaseMessage:
+    """Clip an oversized ToolMessage for summarization input; pass others through."""
+    if (
+        type(msg) is ToolMessage
+        and type(msg.content) is str
+        and len(msg.content) > max_chars
+    ):
+        return ToolMessage(
+            content=msg.content[:max_chars] + "\n...[truncated]",
+            tool_call_id=msg.tool_call_id,
+        )
+    return msg
+
+
+def _prepare_summarization(
+    messages: List[BaseMessage],
+    max_messages_to_keep: int,
+    summary_prompt: Optional[str],
+    delta_threshold: int,
+    max_prefix_tokens: int,
+    tool_content_max_chars: int = 1500
+) -> Optional[tuple]:
+    """Build the summarization request for a history, or None to skip.
+
+    Handles the rolling-summary split (only the delta since the last summary
+    goes back through the model), the delta threshold that avoids an LLM
+    call when too little new history has accumulated, and the token budget
+    that skips summarization while the prefix is still cheap to resend.
+
+    Returns:
+        A (prompt_messages, recent_messages, cache_key) triple, or None when
+        no summarization should happen.
+    """
+    # If we don't have enough messages to summarize, skip
+    if len(messages) <= max_messages_to_keep:
+        return None
+
+    # Rolling summary: when the history already starts with a summary, only
+    # the delta since then needs to go back through the model, keeping the
+    # summarization input O(max_messages_to_keep) instead of O(history)
+    prior_summary = None
+    first = messages[0]
+    if (
+        isinstance(first, AIMessage)
+        and isinstance(first.content, str)
+        and first.content.startswith("Conversation history summary:")
+    ):
+        prior_summary = first
+        messages_to_summarize = messages[1:-max_messages_to_keep]
+        # Too little new history to be worth an LLM call yet
+        if len(messages_to_summarize) < delta_threshold:
+            return None
+    else:
+        messages_to_summarize = messages[:-max_messages_to_keep]
+
+    # Message count is a poor proxy for context pressure: a few huge tool
+    # outputs should summarize while many short lines shouldn't. Only
+    # summarize once the prefix actually costs real tokens to resend.
+    if not _prefix_exceeds_budget(messages_to_summarize, max_prefix_tokens):
+        return None
+
+    # The summary only needs the gist of each tool output, not multi-KB
+    # shell dumps; clipping them bounds the summarizer's input tokens
+    messages_to_summarize = [
+        _truncate_tool_message(m, tool_content_max_chars)
+        for m in messages_to_summarize
+    ]
+
+    recent_messages = messages[-max_messages_to_keep:]
+
+    # Create a summary request with the appropriate prompt
+    if not summary_prompt:
+        summary_prompt = MEMORY_SUMMARIZATION_PROMPT
+
+    # Summaries are short by design: ask for brevity so the summarizer
+    # can't spend seconds rambling
+    summary_prompt = summary_prompt + "\nRespond in under 150 words."
+
+    hashed_prefix = (
+        [prior_summary, *messages_to_summarize]
+        if prior_summary is not None
+        else messages_to_summarize
+    )
+    cache_key = _summary_cache_key(hashed_prefix, summary_prompt)
+
+    # The static instruction leads as the system message so provider
+    # prompt-prefix caches (Anthropic/OpenAI) can reuse it across calls;
+    # putting it after the ever-changing history defeated that. The prompt
+    # must stay constant across turns for the cache to hit. cache_control
+    # marks the boundary explicitly for Anthropic and is ignored elsewhere.
+    system_message = SystemMessage(
+        content=summary_prompt,
+        additional_kwargs={"cache_control": {"type": "ephemeral"}},
+    )
+    if prior_summary is not None:
+        summary_request = HumanMessage(
+            content="Merge the new messages with the prior summary above into one updated summary."
+        )
+        prompt_messages = [
+            system_message, prior_summary, *messages_to_summarize, summary_request
+        ]
+    else:
+        summary_request = HumanMessage(content="Summarize the conversation above.")
+        prompt_messages = [system_message, *messages_to_summarize, summary_request]
+
+    return prompt_messages, recent_messages, cache_key
+
+
+def _store_summary(cache_key: str, summary_message: AIMessage) -> None:
+    """Insert a summary into the cache, evicting the least recently used."""
+    _summary_cache[cache_key] = summary_message
+    if len(_summary_cache) > _SUMMARY_CACHE_MAX:
+        _summary_cache.popitem(last=False)
 
 
 async def summarize_messages(
-    messages: List[BaseMessage], 
+    messages: List[BaseMessage],
     model: BaseLanguageModel,
     max_messages_to_keep: int = 4,
-    summary_prompt: str = None
+    summary_prompt: str = None,
+    delta_threshold: int = 4,
+    max_prefix_tokens: int = 4000,
+    tool_content_max_chars: int = 1500
 ) -> List[BaseMessage]:
     """Summarize a list of messages to reduce token usage.
-    
+
     Args:
         messages: List of messages to summarize
         model: Language model to use for summarization
         max_messages_to_keep: Number of most recent messages to keep unchanged
         summary_prompt: Prompt to use for summarization (if None, uses default)
-        
+        delta_threshold: Minimum number of new messages since the last summary
+            before rolling the summary forward
+        max_prefix_tokens: Token budget the prefix must exceed before a
+            summary is worth an LLM call
+        tool_content_max_chars: Truncate ToolMessage contents beyond this
+            length before summarization
+
     Returns:
         A new list with summarized history and recent messages
     """
-    from react_agent.prompts import MEMORY_SUMMARIZATION_PROMPT
-    
-    # If we don't have enough messages to summarize, return as is
-    if len(messages) <= max_messages_to_keep:
+    prepared = _prepare_summarization(
+        messages, max_messages_to_keep, summary_prompt, delta_threshold,
+        max_prefix_tokens, tool_content_max_chars
+    )
+    if prepared is None:
         return messages
-    
-    # Split into messages to summarize and recent messages to keep
-    messages_to_summarize = messages[:-max_messages_to_keep]
-    recent_messages = messages[-max_messages_to_keep:]
-    
-    # Create a summary request with the appropriate prompt
-    if not summary_prompt:
-        summary_prompt = MEMORY_SUMMARIZATION_PROMPT
-        
-    summary_request = HumanMessage(content=summary_prompt)
-    
-    # Perform the summarization
-    summary_response = await model.ainvoke([*messages_to_summarize, summary_request])
-    
+    prompt_messages, recent_messages, cache_key = prepared
+
+    # Reuse a cached summary when the same prefix was summarized before
+    summary_message = _summary_cache.get(cache_key)
+    if summary_message is not None:
+        _summary_cache.move_to_end(cache_key)
+        out = [summary_message]
+        out.extend(recent_messages)
+        return out
+
+    # Stream the summary, accumulating the chunks: control returns to the
+    # event loop between tokens, so other work (tool output polling, the
+    # next node's setup) proceeds while the summary is still being written
+    parts = []
+    async for chunk in model.bind(max_tokens=256).astream(prompt_messages):
+        content = chunk.content
+        parts.append(content if type(content) is str else get_message_text(chunk))
+
     # Replace the history with a summary message
-    summary_message = AIMessage(content=f"Conversation history summary: {summary_response.content}")
-    
-    # Return the summarized state
-    return [summary_message] + recent_messages
+    summary_message = AIMessage(content=f"Conversation history summary: {''.join(parts)}")
+
+    # Store for later turns, evicting the least recently used entry
+    _store_summary(cache_key, summary_message)
+
+    # Return the summarized state; extend copies straight into the result
+    # instead of materializing an intermediate list via __add__
+    out = [summary_message]
+    out.extend(recent_messages)
+    return out
+
+
+async def summarize_messages_stream(
+    messages: List[BaseMessage],
+    model: BaseLanguageModel,
+    max_messages_to_keep: int = 4,
+    summary_prompt: str = None,
+    delta_threshold: int = 4,
+    max_prefix_tokens: int = 4000,
+    tool_content_max_chars: int = 1500
+) -> AsyncIterator[str]:
+    """Yield the summary text incrementally as the model produces it.
+
+    For callers that can consume progressively (persisting or emitting state
+    as tokens arrive) this exposes the first tokens of the summary without
+    waiting for the last. The finished summary still lands in the cache, so
+    a later summarize_messages call over the same prefix is free. Yields
+    nothing when no summarization is needed; a cached summary is yielded
+    whole.
+    """
+    prepared = _prepare_summarization(
+        messages, max_messages_to_keep, summary_prompt, delta_threshold,
+        max_prefix_tokens, tool_content_max_chars
+    )
+    if prepared is None:
+        return
+    prompt_messages, _, cache_key = prepared
+
+    cached = _summary_cache.get(cache_key)
+    if cached is not None:
+        _summary_cache.move_to_end(cache_key)
+        yield get_message_text(cached)
+        return
+
+    parts = []
+    async for chunk in model.bind(max_tokens=256).astream(prompt_messages):
+        content = chunk.content
+        text = content if type(content) is str else get_message_text(chunk)
+        if text:
+            parts.append(text)
+            yield text
+
+    _store_summary(
+        cache_key,
+        AIMessage(content=f"Conversation history summary: {''.join(parts)}"),
+    )
+
+
+async def summarize_messages_batch(
+    batches: List[List[BaseMessage]],
+    model: BaseLanguageModel,
+    max_messages_to_keep: int = 4,
+    summary_prompt: str = None,
+    delta_threshold: int = 4,
+    max_prefix_tokens: int = 4000,
+    max_concurrency: int = 10,
+    tool_content_max_chars: int = 1500
+) -> List[List[BaseMessage]]:
+    """Summarize several sessions' histories in one batched dispatch.
+
+    In multi-session deployments each session summarizing on its own pays a
+    separate HTTP round trip; abatch fans the pending requests out over one
+    client with bounded concurrency instead. Sessions that don't need a
+    summary (or hit the cache) are returned untouched, in order.
 
+    Args:
+        batches: One message list per session
+        model: Language model to use for summarization
+        max_messages_to_keep: Number of most recent messages to keep unchanged
+        summary_prompt: Prompt to use for summarization (if None, uses default)
+        delta_threshold: Minimum number of new messages since the last summary
+        max_prefix_tokens: Token budget the prefix must exceed to summarize
+        max_concurrency: Concurrent requests allowed within the batch
+
+    Returns:
+        The summarized (or unchanged) message list for each input, in order.
+    """
+    results: List[Optional[List[BaseMessage]]] = []
+    pending = []  # (result index, recent_messages, cache_key)
+    to_run = []
+
+    for messages in batches:
+        prepared = _prepare_summarization(
+            messages, max_messages_to_keep, summary_prompt, delta_threshold,
+            max_prefix_tokens, tool_content_max_chars
+        )
+        if prepared is None:
+            results.append(messages)
+            continue
+        prompt_messages, recent_messages, cache_key = prepared
+
+        cached = _summary_cache.get(cache_key)
+        if cached is not None:
+            _summary_cache.move_to_end(cache_key)
+            out = [cached]
+            out.extend(recent_messages)
+            results.append(out)
+            continue
+
+        pending.append((len(results), recent_messages, cache_key))
+        results.append(None)
+        to_run.append(prompt_messages)
 
-def extract_tool_related_messages(messages: List[BaseMessage]) -> Dict[str, Any]:
+    if to_run:
+        responses = await model.bind(max_tokens=256).abatch(
+            to_run, config={"max_concurrency": max_concurrency}
+        )
+        for (i, recent_messages, cache_key), response in zip(pending, responses):
+            summary_message = AIMessage(
+                content=f"Conversation history summary: {get_message_text(response)}"
+            )
+            _store_summary(cache_key, summary_message)
+            out = [summary_message]
+            out.extend(recent_messages)
+            results[i] = out
+
+    return results
+
+
+# Strong references to in-flight summarization tasks. The event loop only
+# keeps weak references to tasks, so without this a task whose caller was
+# cancelled could be garbage collected mid-run.
+_summary_tasks: set = set()
+
+
+def _reap_summary_task(task: "asyncio.Task") -> None:
+    """Drop the strong reference and consume the task's outcome."""
+    _summary_tasks.discard(task)
+    if not task.cancelled():
+        task.exception()
+
+
+def summarize_messages_start(
+    messages: List[BaseMessage],
+    model: BaseLanguageModel,
+    max_messages_to_keep: int = 4,
+    summary_prompt: str = None,
+    delta_threshold: int = 4,
+    max_prefix_tokens: int = 4000
+) -> "asyncio.Task[List[BaseMessage]]":
+    """Start summarization as a task and return it.
+
+    The task is kept strongly referenced until it finishes and its
+    exception (if any) is consumed by a done callback, so it is safe to
+    await through :func:`asyncio.shield`: if the awaiting turn is
+    cancelled the summarization keeps running and its result still lands
+    in the summary cache for the next turn.
+
+    Returns:
+        An asyncio.Task resolving to the summarized message list.
+    """
+    task = asyncio.create_task(
+        summarize_messages(
+            messages,
+            model,
+            max_messages_to_keep=max_messages_to_keep,
+            summary_prompt=summary_prompt,
+            delta_threshold=delta_threshold,
+            max_prefix_tokens=max_prefix_tokens,
+        )
+    )
+    _summary_tasks.add(task)
+    task.add_done_callback(_reap_summary_task)
+    return task
+
+
+@dataclass(slots=True)
+class ToolUsage:
+    """Tool-call history in struct-of-arrays form.
+
+    Slots keep the container itself lightweight (no per-instance __dict__),
+    and the parallel lists mean thousands of tool calls cost list slots
+    plus shared values rather than a dict per call.
+    """
+
+    ids: List[str] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    args: List[Any] = field(default_factory=list)
+    responses: List[Any] = field(default_factory=list)
+    index: Dict[str, int] = field(default_factory=dict)
+    _current: Optional[str] = None
+
+    def asdict(self) -> Dict[str, Any]:
+        """Return a JSON-serializable dict view of the parallel lists."""
+        return {
+            "ids": self.ids,
+            "names": self.names,
+            "args": self.args,
+            "responses": self.responses,
+            "index": self.index,
+        }
+
+
+def extract_tool_related_messages(messages: List[BaseMessage]) -> ToolUsage:
     """Extract tool calls and their responses from messages.
     
     Args:
         messages: List of messages to process
         
     Returns:
-        Dictionary with tool usage information
+        A ToolUsage with parallel ids/names/args/responses lists and an
+        index mapping tool_id to position, so bulk consumers (counting
+        tool calls, collecting all responses) scan contiguous lists
+        instead of chasing per-call dicts
     """
-    tools_data = {}
-    current_tool_id = None
-    
+    usage = ToolUsage()
+
+    # Type-dispatch table: one hash lookup per message replaces the chained
+    # type checks, so human/system messages that match neither branch cost
+    # a single failed .get instead of two comparisons
+    get_handler = _TOOL_MESSAGE_DISPATCH.get
     for msg in messages:
-        # Track tool calls
-        if isinstance(msg, AIMessage) and msg.tool_calls:
-            for tool_call in msg.tool_calls:
-                tool_id = tool_call.id
-                tools_data[tool_id] = {
-                    "name": tool_call.name,
-                    "args": tool_call.args,
-                    "response": None
-                }
-                current_tool_id = tool_id
-        
-        # Track tool responses
-        elif isinstance(msg, ToolMessage) and current_tool_id:
-            if current_tool_id in tools_data:
-                tools_data[current_tool_id]["response"] = msg.content
-    
-    return tools_data
+        handler = get_handler(type(msg))
+        if handler is not None:
+            handler(msg, usage)
+
+    return usage
+
+
+def _record_tool_calls(msg: AIMessage, usage: ToolUsage) -> None:
+    """Append an AIMessage's tool calls to the accumulator."""
+    tool_calls = msg.tool_calls
+    if not tool_calls:
+        return
+    ids = usage.ids
+    index = usage.index
+    names = usage.names
+    args_list = usage.args
+    responses = usage.responses
+    for tool_call in tool_calls:
+        tool_id = tool_call.id
+        index[tool_id] = len(ids)
+        ids.append(tool_id)
+        names.append(tool_call.name)
+        args_list.append(tool_call.args)
+        responses.append(None)
+        usage._current = tool_id
+
+
+def _record_tool_response(msg: ToolMessage, usage: ToolUsage) -> None:
+    """Attach a ToolMessage's content to the most recent tool call."""
+    i = usage.index.get(usage._current)
+    if i is not None:
+        usage.responses[i] = msg.content
+
+
+_TOOL_MESSAGE_DISPATCH = {
+    AIMessage: _record_tool_calls,
+    ToolMessage: _record_tool_response,
+}
+
+
+@dataclass(slots=True)
+class MessageAnalysis:
+    """Combined results of a single pass over a message history."""
+
+    tools: ToolUsage
+    token_count: int
+    ai_indices: List[int]
+
+
+def analyze_messages(messages: List[BaseMessage]) -> MessageAnalysis:
+    """Collect tool usage, token count, and AI-message positions in one pass.
+
+    Callers that need several of these views used to traverse the history
+    once per view; fusing them into a single loop cuts the pointer-chasing
+    over the message list to one traversal.
+
+    Args:
+        messages: List of messages to process
+
+    Returns:
+        A MessageAnalysis with the fused results.
+    """
+    usage = ToolUsage()
+    ai_indices: List[int] = []
+    token_count = 0
+
+    get_handler = _TOOL_MESSAGE_DISPATCH.get
+    ai_cls = AIMessage
+    for i, msg in enumerate(messages):
+        token_count += _token_len(get_message_text(msg))
+        msg_type = type(msg)
+        if msg_type is ai_cls:
+            ai_indices.append(i)
+        handler = get_handler(msg_type)
+        if handler is not None:
+            handler(msg, usage)
+
+    return MessageAnalysis(tools=usage, token_count=token_count, ai_indices=ai_indices)
@@ -0,0 +1,14 @@
+from react_agent.SSHAgent import _ANSI_RE, _strip_ansi
+
+
+def test_strip_ansi_matches_regex() -> None:
+    cases = [
+        "plain output, no escapes",
+        "\x1b[31mred\x1b[0m",
+        "\x1b[2J\x1b[H\x1b[1;32;44mcolored\x1b[?25h",
+        "truncated sequence \x1b[",
+        "lone escape \x1b at end\x1b",
+        "\x1bM two-char sequence",
+    ]
+    for text in cases:
+        assert _strip_ansi(text) == _ANSI_RE.sub("", text)